@@ -2,28 +2,37 @@
 import time
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import smtplib
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
-import pytz
+from zoneinfo import ZoneInfo
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
+import re
+import threading
 from pathlib import Path
+try:
+    import orjson
+    json_loads, json_dumps = orjson.loads, orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj): return json.dumps(obj).encode()
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:
+    ws_connect = None  # no streaming; prices come from REST polling only
 
 # Load environment variables from .env file
 # The .env file should be located at the repository root
+# KEY=value lines; blank and comment lines never match, inline comments are stripped below
+ENV_LINE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=(.*)$", re.M)
 env_path = Path(__file__).parent.parent / '.env'
 if env_path.exists():
-    with open(env_path) as f:
-        for line in f:
-            raw = line.strip()
-            if not raw or raw.startswith('#'):
-                continue
-            key, _, val = raw.partition('=')
-            key = key.strip()
-            # strip inline comments from value
-            val = val.split('#', 1)[0].strip()
-            os.environ[key] = val
+    for key, val in ENV_LINE.findall(env_path.read_text()):
+        os.environ[key] = val.split('#', 1)[0].strip()
 
 
 # CONFIGURATION
@@ -38,6 +47,17 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+# shared keep-alive session: reuses TCP/TLS connections across calls.
+# Retry only covers idempotent methods (urllib3 default), so orders are never resent.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+))
+# runs the independent per-cycle market-data/position requests side by side
+POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="fetch")
+
 # EMAIL SETTINGS
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
@@ -47,14 +67,17 @@ TO_EMAIL = os.getenv("TO_EMAIL")
 if not all([EMAIL_ADDRESS, EMAIL_PASSWORD, TO_EMAIL]):
     raise RuntimeError("Missing email credentials: EMAIL_ADDRESS, EMAIL_PASSWORD, TO_EMAIL")
 
+# TIMEZONE (reports and log timestamps)
+PACIFIC_TZ = ZoneInfo("US/Pacific")
+
 # STRATEGY PARAMETERS
 TOP_N_SYMBOLS = 5   # select top N cryptos by 24h volume
 
 # Dynamic symbol universe (top N by 24h volume)
 def fetch_top_symbols(n):
-    r = requests.get("https://data.alpaca.markets/v1beta2/crypto/us/tickers", headers=HEADERS)
+    r = SESSION.get("https://data.alpaca.markets/v1beta2/crypto/us/tickers")
     r.raise_for_status()
-    tickers = r.json().get("tickers", [])
+    tickers = json_loads(r.content).get("tickers", [])
     sorted_by_vol = sorted(tickers, key=lambda t: t.get("day", {}).get("v", 0), reverse=True)
     syms = []
     for t in sorted_by_vol[:n]:
@@ -65,11 +88,34 @@ def fetch_top_symbols(n):
             syms.append(s)
     return syms
 
-try:
-    SYMBOLS = fetch_top_symbols(TOP_N_SYMBOLS)
-except Exception:
-    # fallback to manual list if fetch fails
-    SYMBOLS = ["BTC/USD", "ETH/USD", "SOL/USD", "LTC/USD", "AVAX/USD"]
+STATE_FILE = "state.json"
+TOP_SYMBOLS_TTL = 24*3600   # seconds to reuse the top-N list cached in STATE_FILE
+FALLBACK_SYMBOLS = ["BTC/USD", "ETH/USD", "SOL/USD", "LTC/USD", "AVAX/USD"]
+
+
+def cached_top_symbols():
+    # (symbols, wall-clock fetch time) saved by a previous run, or (None, 0)
+    try:
+        with open(STATE_FILE,'rb') as f: saved = json_loads(f.read())
+        return saved.get("top_symbols"), saved.get("top_symbols_cached_at") or 0
+    except Exception:
+        return None, 0
+
+
+def resolve_symbols():
+    cached, cached_at = cached_top_symbols()
+    if cached and time.time() - cached_at < TOP_SYMBOLS_TTL:
+        return cached, cached_at
+    try:
+        return fetch_top_symbols(TOP_N_SYMBOLS), time.time()
+    except Exception:
+        # fetch failed: prefer the stale cache over the manual list; the old
+        # timestamp is kept so the next start tries to refresh again
+        return (cached, cached_at) if cached else (FALLBACK_SYMBOLS, 0)
+
+SYMBOLS, SYMBOLS_CACHED_AT = resolve_symbols()
+# comma-joined symbol list for batched market-data requests
+SYMBOLS_PARAM = ",".join(SYMBOLS)
 SHORT_EMA_PERIOD = 15   # minutes
 LONG_EMA_PERIOD = 60    # minutes
 ATR_PERIOD = 14         # lookback for ATR calculation
@@ -86,99 +132,184 @@ ALPHA_SHORT = 2 / (SHORT_EMA_PERIOD + 1)
 ALPHA_LONG = 2 / (LONG_EMA_PERIOD + 1)
 
 # STATE
-STATE_FILE = "state.json"
+STATE_SAVE_INTERVAL = 300   # max seconds between saves when only EMAs moved
+state_dirty = False         # set when trades/P&L/email bookkeeping change
+last_save = float("-inf")   # time.monotonic() of the last save
 state = {
     "pnl":        {s: 0.0 for s in SYMBOLS},
     "overall_pnl": 0.0,
     "ema_short":  {s: None for s in SYMBOLS},
     "ema_long":   {s: None for s in SYMBOLS},
     "entry_price":{s: None for s in SYMBOLS},
-    "last_email": None
+    "last_email": None,
+    "top_symbols": SYMBOLS,
+    "top_symbols_cached_at": SYMBOLS_CACHED_AT
 }
 history = {s: deque(maxlen=ATR_PERIOD+1) for s in SYMBOLS}
+moves = {s: deque(maxlen=ATR_PERIOD) for s in SYMBOLS}   # |p[i]-p[i-1]| over history
+
+
+def push_price(sym, price):
+    # append to the ATR window, recording the absolute move from the previous price
+    h = history[sym]
+    if h: moves[sym].append(abs(price - h[-1]))
+    h.append(price)
+
+
+def current_atr(sym):
+    m = moves[sym]
+    return sum(m) / ATR_PERIOD if len(m) == ATR_PERIOD else 0.0
 
 # utility: seed ATR history with real 1-min bars
 def seed_history(sym):
     # fetch last ATR_PERIOD+1 1-minute bars to seed ATR history
     url = "https://data.alpaca.markets/v1beta3/crypto/us/bars"
     params = {"symbols": sym, "timeframe": "1Min", "limit": ATR_PERIOD+1}
-    r = requests.get(url, headers=HEADERS, params=params)
+    r = SESSION.get(url, params=params)
     r.raise_for_status()
-    bars = r.json().get("bars", {}).get(sym, [])
+    bars = json_loads(r.content).get("bars", {}).get(sym, [])
     return [b.get("c", 0.0) for b in bars]
 
 
 
 def now_ts():
     # timestamp in US/Pacific
-    return datetime.now(pytz.timezone("US/Pacific")).strftime("%Y-%m-%d %H:%M:%S %Z")
+    return datetime.now(PACIFIC_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
 
 
-def get_orderbook(sym):
+def get_orderbooks():
+    # one request for every symbol: {sym: (mid price, USD depth at best bid)}
     url = "https://data.alpaca.markets/v1beta3/crypto/us/latest/orderbooks"
-    r = requests.get(url, headers=HEADERS, params={"symbols": sym})
+    r = SESSION.get(url, params={"symbols": SYMBOLS_PARAM})
     r.raise_for_status()
-    ob = r.json()["orderbooks"][sym]
-    price = (ob["b"][0]["p"] + ob["a"][0]["p"]) / 2.0
-    depth = ob["b"][0]["s"] * price
-    return price, depth
+    books = {}
+    for sym, ob in json_loads(r.content).get("orderbooks", {}).items():
+        if not ob.get("b") or not ob.get("a"): continue
+        price = (ob["b"][0]["p"] + ob["a"][0]["p"]) / 2.0
+        books[sym] = (price, ob["b"][0]["s"] * price)
+    return books
 
 
-def get_daily_volume(sym):
-    # fetch 1-day bar for the crypto symbol
+# live quotes pushed by the crypto stream: {sym: (mid price, USD depth at best bid, monotonic ts)}
+STREAM_URL = "wss://stream.data.alpaca.markets/v1beta3/crypto/us"
+STREAM_MAX_AGE = 60     # seconds before a streamed quote is considered stale
+latest_quotes = {}
+
+
+def stream_quotes():
+    # background thread: keep latest_quotes current, reconnecting with exponential backoff
+    backoff = 1
+    while True:
+        try:
+            with ws_connect(STREAM_URL) as ws:
+                ws.send(json.dumps({"action": "auth", "key": API_KEY, "secret": API_SECRET}))
+                ws.send(json.dumps({"action": "subscribe", "quotes": SYMBOLS}))
+                print(f"{now_ts()} Quote stream connected")
+                backoff = 1
+                for raw in ws:
+                    for m in json_loads(raw):
+                        if m.get("T") == "q" and m.get("bp") and m.get("ap"):
+                            price = (m["bp"] + m["ap"]) / 2.0
+                            latest_quotes[m["S"]] = (price, m.get("bs", 0.0) * price, time.monotonic())
+                        elif m.get("T") == "error":
+                            print(f"{now_ts()} Quote stream error: {m.get('msg')}")
+        except Exception as e:
+            print(f"{now_ts()} Quote stream closed: {e}")
+        print(f"{now_ts()} Quote stream reconnecting in {backoff}s")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+
+def get_books():
+    # prefer fresh streamed quotes; fall back to one REST call if any symbol lacks one
+    cutoff = time.monotonic() - STREAM_MAX_AGE
+    books = {s: (p, d) for s, (p, d, ts) in list(latest_quotes.items()) if ts >= cutoff}
+    if len(books) < len(SYMBOLS):
+        try:
+            books = {**get_orderbooks(), **books}
+        except Exception as e:
+            # keep trading the symbols that still have fresh streamed quotes
+            print(f"{now_ts()} Orderbook fallback error: {e}")
+    return books
+
+
+_vol_cache = {"day": None, "vols": {}}
+
+
+def get_daily_volumes():
+    # yesterday's completed 1-day bar for every symbol in one request: {sym: volume}
+    # today's bar is still filling, so a completed bar is the only one fixed for the whole UTC day;
+    # fetched once per day (limit counts bars across all symbols: yesterday's plus today's)
+    day = datetime.now(timezone.utc).date()
+    if _vol_cache["day"] == day:
+        return _vol_cache["vols"]
+    prev = (day - timedelta(days=1)).isoformat()
     url = "https://data.alpaca.markets/v1beta3/crypto/us/bars"
-    params = {"symbols": sym, "timeframe": "1Day", "limit": 1}
-    
-    r = requests.get(url, headers=HEADERS, params=params)
+    params = {"symbols": SYMBOLS_PARAM, "timeframe": "1Day", "start": prev, "limit": 2 * len(SYMBOLS)}
+    r = SESSION.get(url, params=params)
     r.raise_for_status()
-    data = r.json().get("bars", {})
-    bars = data.get(sym, [])
-    return float(bars[0].get("v", 0.0)) if bars else 0.0
+    data = json_loads(r.content).get("bars", {})
+    vols = {}
+    for sym, bars in data.items():
+        done = [b for b in bars if b.get("t", "").startswith(prev)]
+        if done: vols[sym] = float(done[0].get("v", 0.0))
+    _vol_cache.update(day=day, vols=vols)
+    return vols
 
 
-def get_position(sym):
-    r = requests.get(f"{BASE_URL}/v2/positions/{sym.replace('/','')}", headers=HEADERS)
-    if r.status_code == 200:
-        d = r.json()
-        return float(d.get("qty", 0.0)), float(d.get("avg_entry_price", 0.0))
-    return 0.0, None
+def get_all_positions():
+    # whole portfolio in one call, keyed by trading symbol (no slash): {sym: (qty, avg_entry)}
+    r = SESSION.get(f"{BASE_URL}/v2/positions")
+    r.raise_for_status()
+    return {p["symbol"]: (float(p.get("qty", 0.0)), float(p.get("avg_entry_price", 0.0))) for p in json_loads(r.content)}
+
+
+ORDER_TEMPLATE = {"type": "market", "time_in_force": "gtc"}
 
 
 def place_order(sym, side, otype, val):
-    # use symbol without slash for trading API calls
-    symbol = sym.replace("/", "")
-    payload = {"symbol": symbol, "side": side, "type": "market", "time_in_force": "gtc"}
-    if otype == "notional": payload["notional"] = str(val)
-    else: payload["qty"] = str(val)
-    r = requests.post(f"{BASE_URL}/v2/orders", headers=HEADERS, json=payload)
+    # use symbol without slash for trading API calls; amounts stay strings (Alpaca's decimal format)
+    payload = {**ORDER_TEMPLATE, "symbol": sym.replace("/", ""), "side": side,
+               ("notional" if otype == "notional" else "qty"): str(val)}
+    # session headers already carry Content-Type: application/json
+    r = SESSION.post(f"{BASE_URL}/v2/orders", data=json_dumps(payload))
     ts = now_ts()
     if r.status_code in (200,201): print(f"{ts} ORDER OK: {sym} {side} {otype} {val}")
     else: print(f"{ts} ORDER FAIL: {sym} {side} {otype} {val} -> {r.status_code}")
     return r
 
 
+def smtp_send(msg):
+    # one short-lived session per send: mail goes out once a day, so a held-open
+    # connection would always have idled past the server's timeout by the next send
+    with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as srv:
+        srv.starttls(); srv.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        srv.sendmail(EMAIL_ADDRESS, TO_EMAIL, msg.as_string())
+
+
 def send_daily_email():
-    today = datetime.now(pytz.timezone("US/Pacific")).date()
+    today = datetime.now(PACIFIC_TZ).date()
     if state["last_email"] == str(today): return
     body = f"📈 Daily Crypto P&L – {today}\n\n"
     for s in SYMBOLS: body += f"{s}: {state['pnl'][s]:+8.2f} USD\n"
     body += f"\nOverall P&L: {state['overall_pnl']:+8.2f} USD"
     msg = MIMEText(body); msg["Subject"] = f"Crypto P&L {today}"; msg["From"] = EMAIL_ADDRESS; msg["To"] = TO_EMAIL
     try:
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as srv:
-            srv.starttls(); srv.login(EMAIL_ADDRESS, EMAIL_PASSWORD); srv.sendmail(EMAIL_ADDRESS, TO_EMAIL, msg.as_string())
-        print(f"{now_ts()} Email sent to {TO_EMAIL}"); state["last_email"] = str(today)
+        smtp_send(msg)
+        print(f"{now_ts()} Email sent to {TO_EMAIL}"); state["last_email"] = str(today); mark_dirty()
     except Exception as e:
         print(f"{now_ts()} Email failed: {e}")
 
 
 def load_state():
     try:
-        with open(STATE_FILE) as f: data = json.load(f); state.update(data); print(f"{now_ts()} Loaded state")
+        with open(STATE_FILE,'rb') as f: data = json_loads(f.read()); state.update(data); print(f"{now_ts()} Loaded state")
     except FileNotFoundError:
         print(f"{now_ts()} No state file—fresh start")
     except Exception as e:
         print(f"{now_ts()} Load error: {e}")
+    # the universe resolved at startup wins over whatever list the file held
+    state["top_symbols"], state["top_symbols_cached_at"] = SYMBOLS, SYMBOLS_CACHED_AT
     for s in SYMBOLS:
         state['pnl'].setdefault(s, 0.0)
         state['ema_short'].setdefault(s, None)
@@ -186,69 +317,112 @@ def load_state():
         state['entry_price'].setdefault(s, None)
 
 
+def mark_dirty():
+    global state_dirty
+    state_dirty = True
+
+
 def save_state():
+    # write to a temp file and swap it in, so a crash never leaves a truncated state file
+    global state_dirty, last_save
     try:
-        with open(STATE_FILE,'w') as f: json.dump(state, f)
+        tmp = STATE_FILE + ".tmp"
+        with open(tmp,'wb') as f: f.write(json_dumps(state))
+        os.replace(tmp, STATE_FILE)
+        state_dirty = False; last_save = time.monotonic()
         print(f"{now_ts()} State saved")
     except Exception as e:
         print(f"{now_ts()} Save error: {e}")
 
 
+def maybe_save_state():
+    # save on real changes immediately; otherwise at most every STATE_SAVE_INTERVAL seconds
+    if state_dirty or time.monotonic() - last_save >= STATE_SAVE_INTERVAL:
+        save_state()
+
+
 def main():
     load_state()
+    books = None
     for s in SYMBOLS:
         if state['ema_short'][s] is None:
             # seed history for ATR from real 1-min bars
             prices = seed_history(s)
             if len(prices) == ATR_PERIOD+1:
-                history[s].clear()
-                history[s].extend(prices)
+                history[s].clear(); moves[s].clear()
+                for p in prices: push_price(s, p)
                 last = prices[-1]
                 state['ema_short'][s] = last
                 state['ema_long'][s] = last
                 print(f"{now_ts()} Seed {s}: last={last:.2f}, ATR seeded")
             else:
                 # fallback to current price if insufficient history
-                p,_ = get_orderbook(s)
+                if books is None: books = get_orderbooks()
+                p,_ = books[s]
                 state['ema_short'][s] = p
                 state['ema_long'][s] = p
-                history[s].extend([p] * (ATR_PERIOD+1))
+                for _ in range(ATR_PERIOD+1): push_price(s, p)
                 print(f"{now_ts()} Init {s}: EMA={p:.2f}")
     save_state()
+    if ws_connect is not None:
+        threading.Thread(target=stream_quotes, name="quote-stream", daemon=True).start()
     try:
+        next_tick = time.monotonic()
         while True:
+            f_books, f_vols, f_pos = POOL.submit(get_books), POOL.submit(get_daily_volumes), POOL.submit(get_all_positions)
+            try:
+                books = f_books.result()
+            except Exception as e:
+                print(f"{now_ts()} Orderbook fetch error: {e}"); books = {}
+            try:
+                vols = f_vols.result()
+            except Exception as e:
+                print(f"{now_ts()} Volume fetch error: {e}"); vols = {}
+            try:
+                positions = f_pos.result()
+            except Exception as e:
+                # without positions we cannot tell a flat symbol from a held one; skip trading this cycle
+                print(f"{now_ts()} Position fetch error: {e}"); positions = None
             for s in SYMBOLS:
                 try:
-                    price,depth = get_orderbook(s)
+                    if s not in books:
+                        print(f"{now_ts()} {s} no orderbook"); continue
+                    price,depth = books[s]
                     ps,pl = state['ema_short'][s], state['ema_long'][s]
                     state['ema_short'][s] = ALPHA_SHORT*price + (1-ALPHA_SHORT)*ps
                     state['ema_long'][s]  = ALPHA_LONG*price  + (1-ALPHA_LONG)*pl
-                    history[s].append(price)
-                    atr = sum(abs(history[s][i] - history[s][i-1]) for i in range(1, len(history[s]))) / ATR_PERIOD if len(history[s])==ATR_PERIOD+1 else 0.0
-                    vol24 = get_daily_volume(s)
+                    push_price(s, price)
+                    atr = current_atr(s)
+                    vol24 = vols.get(s, 0.0)
                     # convert 24h coin volume to USD
                     vol24_usd = vol24 * price
-                    qty,avg = get_position(s)
-                    if qty>0 and state['entry_price'][s] is None: state['entry_price'][s] = avg
+                    if positions is None: continue
+                    qty,avg = positions.get(s.replace("/",""), (0.0, None))
+                    if qty>0 and state['entry_price'][s] is None: state['entry_price'][s] = avg; mark_dirty()
                     if qty==0 and price>state['ema_long'][s]:
                         pct = (price - state['ema_short'][s]) / state['ema_short'][s] * 100
                         if pct <= BUY_DIP and depth >= MIN_DEPTH_USD and vol24_usd >= MIN_DAILY_VOL_USD:
                             size = (RISK_PER_TRADE_USD/atr) if atr>0 else (NOTIONAL_USD/price)
                             size = round(size,6)
                             print(f"{now_ts()} {s} dip {pct:.2f}% ATR={atr:.2f} VOL={vol24:.2f} -> BUY qty={size}")
-                            place_order(s,'buy','qty',size); state['entry_price'][s] = price
+                            place_order(s,'buy','qty',size); state['entry_price'][s] = price; mark_dirty()
                     elif qty>0:
                         entry = state['entry_price'][s]; delta = price - entry
                         if atr>0 and (delta<= -STOP_ATR_MULT*atr or delta>= TAKE_ATR_MULT*atr):
                             tag = 'STOP' if delta<= -STOP_ATR_MULT*atr else 'TAKE'
                             print(f"{now_ts()} {s} {tag} {delta:.2f}% -> SELL qty={qty}")
                             place_order(s,'sell','qty',qty)
-                            pnl = delta*qty; state['pnl'][s]+=pnl; state['overall_pnl']+=pnl; state['entry_price'][s]=None
+                            pnl = delta*qty; state['pnl'][s]+=pnl; state['overall_pnl']+=pnl; state['entry_price'][s]=None; mark_dirty()
                     print(f"{now_ts()} {s} Price={price:.2f} EMA15={ps:.2f} EMA60={pl:.2f} ATR={atr:.2f} VOL={vol24:.2f} Pos={qty}")
                 except Exception as e:
                     print(f"{now_ts()} {s} error: {e}")
-            send_daily_email(); print(f"{now_ts()} Overall P&L: {state['overall_pnl']:+.2f} USD"); save_state()
-            time.sleep(60)
+            send_daily_email(); print(f"{now_ts()} Overall P&L: {state['overall_pnl']:+.2f} USD"); maybe_save_state()
+            # sleep to the next 60s deadline so loop work doesn't stretch the period;
+            # after an overrun, start a fresh schedule instead of firing back-to-back
+            next_tick += 60
+            now = time.monotonic()
+            if next_tick < now: next_tick = now
+            time.sleep(next_tick - now)
     except KeyboardInterrupt:
         print("Interrupted, saving state..."); save_state()
 
@@ -1,21 +1,59 @@
-import os, sys, json, time, logging, csv, pytz, smtplib, math
+import os, sys, json, time, logging, csv, smtplib, math, atexit
 from pathlib import Path
+from functools import lru_cache
 from datetime import datetime, date, timedelta, time as dt_time
 from email.mime.text import MIMEText
 from logging.handlers import RotatingFileHandler
 import signal
+import threading
 import random
+import requests
 from alpaca_trade_api.rest import REST, TimeFrame, APIError
 from collections import deque, defaultdict
 from typing import Sequence, Optional
+from zoneinfo import ZoneInfo
+try:
+    import orjson
+    _dumps, _loads = orjson.dumps, orjson.loads
+except ImportError:
+    def _dumps(obj): return json.dumps(obj, separators=(",", ":")).encode()
+    _loads = json.loads
+import numpy as np
 
 
 
+class PriceWindow:
+    """Bounded price window that keeps a running sum, so its SMA costs O(1) per tick."""
+
+    def __init__(self, maxlen: Optional[int] = None):
+        self.prices = deque(maxlen=maxlen or SMA_PERIOD)
+        self.total = 0.0
+        self._appends = 0
+
+    def append(self, price: float) -> None:
+        if len(self.prices) == self.prices.maxlen:
+            self.total -= self.prices[0]
+        self.prices.append(price)
+        self.total += price
+        # re-sum once per full window to stop floating-point drift accumulating
+        self._appends += 1
+        if self._appends >= self.prices.maxlen:
+            self._appends = 0
+            self.total = sum(self.prices)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __iter__(self):
+        return iter(self.prices)
+
+
 def compute_sma(prices: Sequence[float]) -> Optional[float]:
     """Compute Simple Moving Average if enough data points are available."""
     if len(prices) < SMA_PERIOD:
         return None
-    return sum(prices) / len(prices)
+    total = prices.total if isinstance(prices, PriceWindow) else sum(prices)
+    return total / len(prices)
 
 
 # ─── CONFIG ─────────────────────────────────────────────────────────────────────
@@ -43,6 +81,12 @@ BUY_TRIGGER_B = float(os.getenv("BUY_TRIGGER_B", 0.98))
 SELL_TRIGGER_B = float(os.getenv("SELL_TRIGGER_B", 1.03))
 STOP_MULTIPLIER_B = float(os.getenv("STOP_MULTIPLIER_B", 0.5))
 
+# Per-bot settings: (name, symbols file, buy trigger, sell trigger, stop multiplier)
+BOTS = (
+    ("Bot A", BOT_A_SYMBOLS_FILE, BUY_TRIGGER_A, SELL_TRIGGER_A, STOP_MULTIPLIER_A),
+    ("Bot B", BOT_B_SYMBOLS_FILE, BUY_TRIGGER_B, SELL_TRIGGER_B, STOP_MULTIPLIER_B),
+)
+
 # Risk and baseline parameters
 ATR_PERIOD = int(os.getenv("ATR_PERIOD", 14))
 RISK_PCT = float(os.getenv("RISK_PCT", 0.015))
@@ -55,8 +99,9 @@ SMA_PERIOD = int(os.getenv("SMA_PERIOD", 20))
 # Circuit breaker settings
 CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", 5))
 CIRCUIT_BREAKER_COOLDOWN = int(os.getenv("CIRCUIT_BREAKER_COOLDOWN", 60))
-# Track consecutive API call failures
-error_streak = 0
+# Retry settings: max total seconds spent backing off per call, and statuses worth retrying
+RETRY_BUDGET = float(os.getenv("RETRY_BUDGET", 60))
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
 
 # Email settings
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
@@ -66,7 +111,7 @@ EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 
 # Timezone and market hours (Eastern)
-ET = pytz.timezone(os.getenv("ET_TIMEZONE", "US/Eastern"))
+ET = ZoneInfo(os.getenv("ET_TIMEZONE", "US/Eastern"))
 LUNCH_START = dt_time(int(os.getenv("LUNCH_START_HOUR", 11)), int(os.getenv("LUNCH_START_MIN", 30)))
 LUNCH_END = dt_time(int(os.getenv("LUNCH_END_HOUR", 13)), int(os.getenv("LUNCH_END_MIN", 0)))
 MARKET_CLOSE = dt_time(int(os.getenv("MARKET_CLOSE_HOUR", 16)), int(os.getenv("MARKET_CLOSE_MIN", 0)))
@@ -84,13 +129,15 @@ if missing:
     if __name__ == "__main__":
         sys.exit(1)
 
-def is_lunch_time():
-    now_et = datetime.now(ET).time()
-    return LUNCH_START <= now_et < LUNCH_END
+def is_lunch_time(now_time=None):
+    if now_time is None:
+        now_time = datetime.now(ET).time()
+    return LUNCH_START <= now_time < LUNCH_END
 
-def is_market_close():
-    now_et = datetime.now(ET).time()
-    return now_et >= MARKET_CLOSE
+def is_market_close(now_time=None):
+    if now_time is None:
+        now_time = datetime.now(ET).time()
+    return now_time >= MARKET_CLOSE
 
 logging.basicConfig(
     level=logging.INFO,
@@ -104,41 +151,98 @@ api = None
 if __name__ == "__main__":
     api = REST(API_KEY, API_SECRET, BASE_URL)
 
+# ─── CIRCUIT BREAKER ───────────────────────────────────────────────────────────
+class CircuitBreaker:
+    """Consecutive-failure breaker shared by all API calls.
+
+    CLOSED: calls go through. After `threshold` consecutive failures it turns OPEN
+    and calls fail fast for `cooldown` seconds. After that it is HALF_OPEN: one
+    probe is let through, closing the breaker on success or re-opening it on failure.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failure_count = 0
+
+    def record_failure(self) -> None:
+        self.failure_count += 1
+        if self.state == self.HALF_OPEN or self.failure_count >= self.threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+breaker = CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN)
+
 # ─── EXPONENTIAL BACKOFF ────────────────────────────────────────────────────────
+def is_retryable(exc):
+    """Transient failures only: network errors, timeouts, throttling and 5xx. Auth/validation errors never succeed on retry."""
+    if isinstance(exc, APIError):
+        return exc.status_code is None or exc.status_code in RETRYABLE_STATUS
+    # alpaca-trade-api re-raises a bare HTTPError when the error body carries no code
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
 def retry_api_call(func, *args, retries=5, base_delay=5, **kwargs):
-    global error_streak
+    name = getattr(func, "__name__", repr(func))
+    # Fail fast while the breaker is open instead of stacking more retries
+    if not breaker.allow():
+        return None
+    # Tracebacks are costly to format; transient failures only get them at DEBUG
+    verbose = logging.getLogger().isEnabledFor(logging.DEBUG)
+    waited = 0.0
     for i in range(retries):
         try:
             result = func(*args, **kwargs)
-            # reset error streak on success
-            error_streak = 0
+            breaker.record_success()
             return result
         except Exception as e:
             # Return None for missing positions or symbols
             if any(msg in str(e) for msg in ("position does not exist", "symbol not found")):
+                breaker.record_success()  # the API answered, so it is reachable
                 return None
-            # increment error streak
-            error_streak += 1
-            logging.exception(f"Error calling {func.__name__} — full traceback")
-            # Circuit breaker: cooldown on too many consecutive errors
-            if error_streak >= CIRCUIT_BREAKER_THRESHOLD:
-                logging.error(f"Circuit breaker tripped after {error_streak} errors. Cooling down for {CIRCUIT_BREAKER_COOLDOWN}s.")
-                time.sleep(CIRCUIT_BREAKER_COOLDOWN)
-                error_streak = 0
+            if not is_retryable(e):
+                # A 4xx still proves the API is reachable; local errors say nothing either way
+                if isinstance(e, (APIError, requests.HTTPError)):
+                    breaker.record_success()
+                logging.error(f"{name} rejected ({getattr(e, 'status_code', None)}): {e}. Not retrying.")
                 return None
-            # Jittered exponential backoff
-            jitter = random.uniform(0.5, 1.5)
-            wait = base_delay * (2 ** i) * jitter
-            logging.warning(f"API call failed: {e}. Retrying in {wait:.1f}s...")
+            breaker.record_failure()
+            if breaker.state == CircuitBreaker.OPEN:
+                logging.error(f"Circuit breaker open after {breaker.failure_count} errors ({name}: {e}). Failing fast for {CIRCUIT_BREAKER_COOLDOWN}s.", exc_info=verbose)
+                return None
+            if i == retries - 1:
+                logging.exception(f"Error calling {name} — full traceback")
+                raise RuntimeError(f"API call failed after {retries} retries: {name}") from e
+            # Full-jitter exponential backoff, bounded by a per-call budget
+            wait = random.uniform(0, base_delay * (2 ** i))
+            if waited + wait > RETRY_BUDGET:
+                logging.error(f"Retry budget of {RETRY_BUDGET:.0f}s exhausted for {name}: {e}", exc_info=verbose)
+                return None
+            waited += wait
+            logging.warning(f"API call {name} failed: {e}. Retrying in {wait:.1f}s...", exc_info=verbose)
             time.sleep(wait)
-    raise RuntimeError(f"API call failed after {retries} retries: {func.__name__}")
 
 # ─── BASELINE MANAGEMENT ───────────────────────────────────────────────────────
 def load_baselines():
     if not os.path.exists(BASELINE_FILE):
         return {}
-    with open(BASELINE_FILE) as f:
-        raw = json.load(f)
+    with open(BASELINE_FILE, "rb") as f:
+        raw = _loads(f.read())
     out = {}
     now = datetime.utcnow()
     for sym, data in raw.items():
@@ -147,80 +251,163 @@ def load_baselines():
             out[sym] = {"price": data["price"], "ts": ts}
     return out
 
+def _atomic_json_dump(obj, path):
+    """Write compact JSON to a temp file and swap it in, so a crash never leaves a partial file."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_dumps(obj))
+    os.replace(tmp, path)
+
 def save_baselines(baselines):
     dump = {
         sym: {"price": v["price"], "ts": v["ts"].isoformat()}
         for sym, v in baselines.items()
     }
-    with open(BASELINE_FILE, "w") as f:
-        json.dump(dump, f, indent=2)
-
-def record_price_history(symbol, price, baseline):
+    _atomic_json_dump(dump, BASELINE_FILE)
+
+# ─── SYMBOL LISTS ──────────────────────────────────────────────────────────────
+@lru_cache(maxsize=8)
+def _read_symbols(path_str, mtime_ns, size):
+    with open(path_str) as f:
+        return tuple(line.strip() for line in f if line.strip())
+
+def read_symbols(path):
+    """Symbols listed one per line in path; the file is only re-read when its mtime or size changes."""
+    st = path.stat()
+    return _read_symbols(str(path), st.st_mtime_ns, st.st_size)
+
+# ─── CSV LOGS ──────────────────────────────────────────────────────────────────
+# Long-lived buffered handles, opened on first write and closed at exit
+_price_fh = _price_writer = None
+_trade_fh = _trade_writer = None
+
+def _open_csv(path, header):
+    fh = open(path, "a", newline="", buffering=1 << 16)
+    writer = csv.writer(fh)
+    if fh.tell() == 0:
+        writer.writerow(header)
+    atexit.register(fh.close)
+    return fh, writer
+
+def flush_csv_logs():
+    for fh in (_price_fh, _trade_fh):
+        if fh is not None:
+            fh.flush()
+
+def record_price_history(symbol, price, baseline, ts: Optional[datetime] = None):
+    global _price_fh, _price_writer
     try:
-        with open(PRICE_HISTORY_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
-            if f.tell() == 0:
-                writer.writerow(["timestamp", "symbol", "price", "baseline"])
-            writer.writerow([datetime.utcnow().isoformat(), symbol, price, baseline])
+        if _price_writer is None:
+            _price_fh, _price_writer = _open_csv(PRICE_HISTORY_FILE, ["timestamp", "symbol", "price", "baseline"])
+        _price_writer.writerow([(ts or datetime.utcnow()).isoformat(), symbol, price, baseline])
     except Exception as e:
         logging.error(f"Failed to record price history: {e}")
 
 baselines = load_baselines()
+# Set when a baseline resets; the file is rewritten once at the end of the tick
+baselines_dirty = False
 
 
 # Sliding windows for SMA trend filter
-price_windows = defaultdict(lambda: deque(maxlen=SMA_PERIOD))
+price_windows = defaultdict(PriceWindow)
 
 # ─── POSITION & PRICE HELPERS ──────────────────────────────────────────────────
-def get_position_info(symbol):
-    p = retry_api_call(api.get_position, symbol)
-    if not p:
-        return 0.0, 0.0
-    return float(p.qty), float(p.avg_entry_price)
-
-def get_current_price(symbol):
-    t = retry_api_call(api.get_latest_trade, symbol)
+def get_positions():
+    """All open positions in one request: {symbol: (qty, avg_entry_price)}, or None if unavailable."""
+    positions = retry_api_call(api.list_positions)
+    if positions is None:
+        return None
+    return {p.symbol: (float(p.qty), float(p.avg_entry_price)) for p in positions}
+
+def get_latest_trades(symbols):
+    """Latest trade for every symbol in one request: {symbol: trade}."""
+    if not symbols:
+        return {}
+    return retry_api_call(api.get_latest_trades, list(symbols)) or {}
+
+def get_current_price(symbol, latest_trades):
+    t = latest_trades.get(symbol)
     if t: return t.price
     bars = retry_api_call(api.get_bars, symbol, TimeFrame.Minute, limit=1)
     return bars[-1].c if bars else None
 
-def calculate_atr(symbol):
-    bars = retry_api_call(api.get_bars, symbol, TimeFrame.Day, limit=ATR_PERIOD+1)
-    if not bars:
+def true_range_atr(highs: Sequence[float], lows: Sequence[float], closes: Sequence[float]) -> Optional[float]:
+    """Average True Range over consecutive bars (the first bar only supplies a previous close)."""
+    if len(closes) < 2:
         return None
-    trs = []
-    prev_close = bars[0].c
-    for bar in bars[1:]:
-        tr = max(bar.h - bar.l, abs(bar.h - prev_close), abs(bar.l - prev_close))
-        trs.append(tr)
-        prev_close = bar.c
-    return sum(trs)/len(trs) if trs else None
+    h, l, c = (np.asarray(a, dtype=np.float64) for a in (highs, lows, closes))
+    prev_close = c[:-1]
+    tr = np.maximum.reduce([h[1:] - l[1:], np.abs(h[1:] - prev_close), np.abs(l[1:] - prev_close)])
+    return float(tr.mean())
+
+def _bar_date(bar):
+    """ET trading date of a daily bar."""
+    t = bar.t
+    if isinstance(t, str):
+        t = datetime.fromisoformat(t.replace("Z", "+00:00"))
+    return t.astimezone(ET).date()
+
+# Daily-bar ATR only moves once per trading day: symbol -> (ET date, atr)
+_atr_cache = {}
+
+def calculate_atrs(symbols, today=None):
+    """ATR for every symbol, fetching daily bars in one request for symbols not yet cached today."""
+    if today is None:
+        today = datetime.now(ET).date()
+    missing = [sym for sym in symbols if _atr_cache.get(sym, (None,))[0] != today]
+    if missing:
+        # limit counts bars across all symbols, so bound the request by date instead
+        # (2x calendar days comfortably covers ATR_PERIOD+1 trading days)
+        start = (today - timedelta(days=2 * ATR_PERIOD + 10)).isoformat()
+        bars = retry_api_call(api.get_bars, missing, TimeFrame.Day, start=start)
+        # A failed request leaves symbols uncached so the next tick retries them
+        if bars is not None:
+            by_symbol = defaultdict(list)
+            for bar in bars:
+                # today's bar is still forming and would skew the cached ATR all day
+                if _bar_date(bar) < today:
+                    by_symbol[bar.S].append(bar)
+            # Symbols with too few (or no) bars are cached as None so they aren't refetched every tick
+            for sym in missing:
+                sym_bars = by_symbol.get(sym, [])[-(ATR_PERIOD + 1):]
+                atr = true_range_atr([b.h for b in sym_bars], [b.l for b in sym_bars], [b.c for b in sym_bars])
+                _atr_cache[sym] = (today, atr)
+    atrs = {}
+    for sym in symbols:
+        day, atr = _atr_cache.get(sym, (None, None))
+        if day == today and atr is not None:
+            atrs[sym] = atr
+    return atrs
 
 def log_trade(action, symbol, qty, price):
-    fieldnames = ["timestamp", "action", "symbol", "quantity", "price"]
-    file_exists = os.path.isfile(TRADE_LOG_FILE)
-    with open(TRADE_LOG_FILE, mode="a", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            "timestamp": datetime.utcnow().isoformat(),
-            "action": action,
-            "symbol": symbol,
-            "quantity": qty,
-            "price": price
-        })
+    global _trade_fh, _trade_writer
+    if _trade_writer is None:
+        _trade_fh, _trade_writer = _open_csv(TRADE_LOG_FILE, ["timestamp", "action", "symbol", "quantity", "price"])
+    _trade_writer.writerow([datetime.utcnow().isoformat(), action, symbol, qty, price])
+    # trades are rare and must survive a crash, so push them out immediately
+    _trade_fh.flush()
 
 
 # ─── GRACEFUL SHUTDOWN HANDLER ──────────────────────────────────────────
+# Set on shutdown; the main loop sleeps on it so a signal ends the wait at once
+stop_event = threading.Event()
+
 def graceful_shutdown(signum, frame):
+    # Only flag the stop: the loop finishes its tick, breaks, and cleans up after itself
     logging.info(f"Received signal {signum}, shutting down.")
+    stop_event.set()
+
+def finish_shutdown():
+    try:
+        if baselines_dirty:
+            save_baselines(baselines)
+    except Exception:
+        logging.exception("Error saving baselines on shutdown")
     try:
         if summary and not sent_closing_email:
             send_email("Early Exit Market Summary", "\n".join(summary))
     except Exception:
         logging.exception("Error sending summary on shutdown")
-    sys.exit(0)
 
 signal.signal(signal.SIGINT, graceful_shutdown)
 signal.signal(signal.SIGTERM, graceful_shutdown)
@@ -239,18 +426,28 @@ logging.info("Market Sentinel bot started.")
 summary = []
 sent_closing_email = False
 last_trading_date = None
+clock = None
+next_tick = time.monotonic()
 
 while api is not None:
     try:
-        clock = retry_api_call(api.get_clock)
+        # One clock reading per tick, shared by every check below
+        now_et = datetime.now(ET)
+        now_utc = datetime.utcnow()
+        today_et = now_et.date()
+        lunch = is_lunch_time(now_et.time())
+
+        # The clock only changes state at its next open/close, so refetch once that time passes
+        if clock is None or now_et >= (clock.next_close if clock.is_open else clock.next_open):
+            clock = retry_api_call(api.get_clock)
         is_open, next_open = clock.is_open, clock.next_open
 
         # Reset summary and email flag at start of new trading day
-        today_et = datetime.now(ET).date()
         if is_open and last_trading_date != today_et:
             summary.clear()
             sent_closing_email = False
             last_trading_date = today_et
+            _atr_cache.clear()
         if not is_open:
             logging.info(f"Market closed. Sleeping until {next_open}…")
             # Sleep until next market open
@@ -258,57 +455,73 @@ while api is not None:
             seconds = (next_open - now).total_seconds()
             sleep_sec = max(seconds, 60)
             logging.info(f"Market closed. Sleeping {sleep_sec:.0f}s until {next_open}")
-            time.sleep(sleep_sec)
+            if stop_event.wait(sleep_sec):
+                break
+            next_tick = time.monotonic()
             continue
 
-        cash = float(retry_api_call(api.get_account).cash)
+        account = retry_api_call(api.get_account)
+        cash = float(account.cash)
         logging.info(f"Buying power (cash): ${cash:.2f}")
 
-        for bot_name, file_path, bt, st, sm in [
-            ("Bot A", BOT_A_SYMBOLS_FILE, BUY_TRIGGER_A, SELL_TRIGGER_A, STOP_MULTIPLIER_A),
-            ("Bot B", BOT_B_SYMBOLS_FILE, BUY_TRIGGER_B, SELL_TRIGGER_B, STOP_MULTIPLIER_B),
-        ]:
+        bots = []
+        for bot_name, file_path, bt, st, sm in BOTS:
             try:
-                with open(file_path) as f:
-                    symbols = [line.strip() for line in f if line.strip()]
+                symbols = read_symbols(file_path)
             except Exception as e:
                 logging.error(f"Failed to read symbols from {file_path}: {e}")
                 continue
+            bots.append((bot_name, symbols, bt, st, sm))
+
+        # Market data for both bots' symbols in one request each, then sliced per symbol
+        all_syms = sorted({sym for _, symbols, *_ in bots for sym in symbols})
+        latest_trades = get_latest_trades(all_syms)
+        positions = get_positions()
+        if positions is None:
+            logging.warning("Positions unavailable; skipping trade decisions this tick")
+        atrs = calculate_atrs(all_syms, today_et)
+
+        for bot_name, symbols, bt, st, sm in bots:
             for sym in symbols:
-                price = get_current_price(sym)
+                price = get_current_price(sym, latest_trades)
                 if not price:
                     continue
-                qty, avg_entry = get_position_info(sym)
 
-                now = datetime.utcnow()
                 bl = baselines.get(sym)
-                atr = calculate_atr(sym) or 0
+                atr = atrs.get(sym) or 0
 
                 reset_req = False
                 if bl is None:
                     reset_req = True
-                elif (now - bl["ts"]) > timedelta(hours=RESET_HOURS):
+                elif (now_utc - bl["ts"]) > timedelta(hours=RESET_HOURS):
                     reset_req = True
                 elif abs(price - bl["price"]) / bl["price"] > BASELINE_DRIFT:
                     if atr > 0 and (atr / price) > VOLATILITY_FILTER:
                         reset_req = True
 
                 if reset_req:
-                    baselines[sym] = {"price": price, "ts": now}
-                    save_baselines(baselines)
+                    baselines[sym] = {"price": price, "ts": now_utc}
+                    baselines_dirty = True
                     logging.info(f"[{bot_name}][{sym}] Reset baseline → ${price:.2f}")
 
                 base_price = baselines[sym]["price"]
-                record_price_history(sym, price, base_price)
-                # SMA trend filter
-                price_windows[sym].append(price)
-                sma = compute_sma(price_windows[sym])
-                if sma is None:
-                    logging.info(f"[{bot_name}][{sym}] Waiting for SMA warm-up ({len(price_windows[sym])}/{SMA_PERIOD})")
+                record_price_history(sym, price, base_price, now_utc)
+                window = price_windows[sym]
+                window.append(price)
+                if positions is None:
                     continue
-                trend_ok = price > sma
-                logging.info(f"[{bot_name}][{sym}] SMA:{sma:.2f}, Trend:{'PASS' if trend_ok else 'FAIL'}")
-
+                qty, avg_entry = positions.get(sym, (0.0, 0.0))
+                if qty == 0:
+                    # Flat: only a buy is possible, and never during lunch
+                    if lunch:
+                        continue
+                    # SMA trend filter gates buys only; held positions go straight to sell/stop checks
+                    sma = compute_sma(window)
+                    if sma is None:
+                        logging.info(f"[{bot_name}][{sym}] Waiting for SMA warm-up ({len(window)}/{SMA_PERIOD})")
+                        continue
+                    trend_ok = price > sma
+                    logging.info(f"[{bot_name}][{sym}] SMA:{sma:.2f}, Trend:{'PASS' if trend_ok else 'FAIL'}")
 
                 buy_price = base_price * bt
                 sell_price = base_price * st
@@ -318,32 +531,57 @@ while api is not None:
                     f"[{bot_name}][{sym}] Base:${base_price:.2f}, Curr:${price:.2f}, Buy@${buy_price:.2f}, Sell@${sell_price:.2f}, Stop@${stop_price:.2f}, Owned={qty:.4f}"
                 )
 
-                if qty == 0 and price <= buy_price and trend_ok and not is_lunch_time():
+                if qty == 0 and price <= buy_price and trend_ok:
                     qty_to_buy = round((cash * RISK_PCT) / price, 6)
-                    retry_api_call(api.submit_order, symbol=sym, qty=qty_to_buy, side="buy", type="market", time_in_force="day")
+                    order = retry_api_call(api.submit_order, symbol=sym, qty=qty_to_buy, side="buy", type="market", time_in_force="day")
                     log_trade("buy", sym, qty_to_buy, price)
+                    # positions is a per-tick snapshot; update it so a later bot trading the same symbol sees this fill
+                    if order is not None:
+                        positions[sym] = (qty_to_buy, price)
                     summary.append(f"[{bot_name}] BUY {qty_to_buy:.6f} of {sym} @ ${price:.2f}")
                 elif qty > 0:
                     if price >= sell_price:
-                        retry_api_call(api.submit_order, symbol=sym, qty=qty, side="sell", type="market", time_in_force="day")
+                        order = retry_api_call(api.submit_order, symbol=sym, qty=qty, side="sell", type="market", time_in_force="day")
                         log_trade("sell", sym, qty, price)
                         summary.append(f"[{bot_name}] SELL (target) {qty:.6f} of {sym} @ ${price:.2f}")
+                        if order is not None:
+                            positions[sym] = (0.0, 0.0)
                     elif price <= stop_price:
-                        retry_api_call(api.submit_order, symbol=sym, qty=qty, side="sell", type="market", time_in_force="day")
+                        order = retry_api_call(api.submit_order, symbol=sym, qty=qty, side="sell", type="market", time_in_force="day")
                         log_trade("sell", sym, qty, price)
                         summary.append(f"[{bot_name}] SELL (stop) {qty:.6f} of {sym} @ ${price:.2f}")
-
-        if is_market_close() and not sent_closing_email:
-            equity = float(retry_api_call(api.get_account).equity)
-            positions = retry_api_call(api.list_positions) or []
-            unrealized = sum(float(p.unrealized_pl) for p in positions)
+                        if order is not None:
+                            positions[sym] = (0.0, 0.0)
+
+        if baselines_dirty:
+            save_baselines(baselines)
+            baselines_dirty = False
+        flush_csv_logs()
+
+        if is_market_close(now_et.time()) and not sent_closing_email:
+            equity = float(account.equity)
+            eod_positions = retry_api_call(api.list_positions) or []
+            unrealized = sum(float(p.unrealized_pl) for p in eod_positions)
             summary.append("")
             summary.append(f"EOD Equity: ${equity:.2f}")
             summary.append(f"Unrealized P/L: ${unrealized:.2f}")
             send_email("Daily Market Summary", "\n".join(summary or ["No trades today."]))
             sent_closing_email = True
 
-        time.sleep(60)
+        # Sleep to the next 60s deadline so tick work doesn't stretch the period
+        next_tick += 60
+        sleep_for = next_tick - time.monotonic()
+        if sleep_for < 0:
+            logging.warning(f"Tick overran by {-sleep_for:.1f}s")
+            next_tick = time.monotonic()
+            sleep_for = 0
+        if stop_event.wait(sleep_for):
+            break
     except Exception:
         logging.exception("Main loop error — full traceback")
-        time.sleep(60)
\ No newline at end of file
+        if stop_event.wait(60):
+            break
+        next_tick = time.monotonic()
+
+if api is not None:
+    finish_shutdown()
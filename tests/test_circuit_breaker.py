@@ -0,0 +1,38 @@
+from market_sentinel.main import CircuitBreaker
+
+
+def test_breaker_opens_after_threshold_failures():
+    cb = CircuitBreaker(threshold=3, cooldown=60)
+    for _ in range(2):
+        cb.record_failure()
+        assert cb.state == CircuitBreaker.CLOSED
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.OPEN
+    assert not cb.allow()
+
+
+def test_breaker_success_resets_failure_count():
+    cb = CircuitBreaker(threshold=2, cooldown=60)
+    cb.record_failure()
+    cb.record_success()
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    cb = CircuitBreaker(threshold=1, cooldown=0)
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.OPEN
+    assert cb.allow()
+    assert cb.state == CircuitBreaker.HALF_OPEN
+    cb.record_success()
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_probe_failure_reopens():
+    cb = CircuitBreaker(threshold=5, cooldown=0)
+    for _ in range(5):
+        cb.record_failure()
+    assert cb.allow()
+    cb.record_failure()
+    assert cb.state == CircuitBreaker.OPEN
@@ -1,7 +1,7 @@
 import pytest
 from collections import deque
 
-from market_sentinel.main import compute_sma, SMA_PERIOD
+from market_sentinel.main import compute_sma, PriceWindow, SMA_PERIOD
 
 
 def test_compute_sma_insufficient_data():
@@ -22,3 +22,23 @@ def test_compute_sma_with_deque_overflow():
     # Expect average of last SMA_PERIOD values
     expected = sum(values[-SMA_PERIOD:]) / SMA_PERIOD
     assert compute_sma(window) == pytest.approx(expected)
+
+
+def test_price_window_running_sum_tracks_evictions():
+    window = PriceWindow()
+    values = [float(i) for i in range(1, SMA_PERIOD * 3 + 4)]
+    for v in values:
+        window.append(v)
+    assert len(window) == SMA_PERIOD
+    assert list(window) == values[-SMA_PERIOD:]
+    assert window.total == pytest.approx(sum(values[-SMA_PERIOD:]))
+
+
+def test_compute_sma_with_price_window():
+    window = PriceWindow()
+    for i in range(1, SMA_PERIOD):
+        window.append(float(i))
+    assert compute_sma(window) is None
+    window.append(float(SMA_PERIOD))
+    expected = sum(range(1, SMA_PERIOD + 1)) / SMA_PERIOD
+    assert compute_sma(window) == pytest.approx(expected)
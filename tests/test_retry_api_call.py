@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+from alpaca_trade_api.rest import APIError
+
+from market_sentinel import main
+
+
+def _api_error(status):
+    http_error = SimpleNamespace(response=SimpleNamespace(status_code=status)) if status else None
+    return APIError({"message": f"status {status}"}, http_error)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    monkeypatch.setattr(main, "breaker", main.CircuitBreaker(threshold=100, cooldown=60))
+
+
+def test_client_errors_are_not_retryable():
+    assert not main.is_retryable(_api_error(403))
+
+
+@pytest.mark.parametrize("status", [503, None])
+def test_server_errors_and_missing_status_are_retryable(status):
+    assert main.is_retryable(_api_error(status))
+
+
+def test_forbidden_is_not_retried():
+    calls = []
+
+    def forbidden():
+        calls.append(1)
+        raise _api_error(403)
+
+    assert main.retry_api_call(forbidden) is None
+    assert len(calls) == 1
+
+
+def test_returns_none_once_retry_budget_is_spent(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(main, "RETRY_BUDGET", 10)
+    monkeypatch.setattr(main.random, "uniform", lambda lo, hi: hi)
+    monkeypatch.setattr(main.time, "sleep", sleeps.append)
+
+    def unavailable():
+        raise _api_error(503)
+
+    # waits of 4 then 8 would exceed the 10s budget, so only the first is slept
+    assert main.retry_api_call(unavailable, retries=5, base_delay=4) is None
+    assert sleeps == [4]
+
+
+def test_plain_http_errors_use_status_code():
+    def http_error(status):
+        return requests.HTTPError(response=SimpleNamespace(status_code=status))
+
+    assert not main.is_retryable(http_error(401))
+    assert main.is_retryable(http_error(502))
+
+
+@pytest.mark.parametrize("exc", [requests.ConnectionError("reset"), requests.Timeout("slow")])
+def test_network_errors_are_retryable(exc):
+    assert main.is_retryable(exc)
+
+
+def test_programming_errors_are_not_retried(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(main.time, "sleep", sleeps.append)
+
+    def broken():
+        raise TypeError("bad argument")
+
+    assert main.retry_api_call(broken) is None
+    assert sleeps == []
+
+
+def test_rejected_call_closes_half_open_breaker(monkeypatch):
+    cb = main.CircuitBreaker(threshold=1, cooldown=0)
+    cb.record_failure()
+    monkeypatch.setattr(main, "breaker", cb)
+
+    def forbidden():
+        raise _api_error(403)
+
+    assert main.retry_api_call(forbidden) is None
+    assert cb.state == main.CircuitBreaker.CLOSED
+    assert cb.failure_count == 0
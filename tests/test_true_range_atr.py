@@ -0,0 +1,70 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from market_sentinel import main
+from market_sentinel.main import true_range_atr
+
+
+def test_true_range_atr_insufficient_bars():
+    assert true_range_atr([10.0], [9.0], [9.5]) is None
+
+
+def test_true_range_atr_matches_manual_loop():
+    highs = [10.0, 11.0, 10.5, 12.0]
+    lows = [9.0, 9.5, 8.0, 10.8]
+    closes = [9.5, 10.8, 8.2, 11.9]
+    trs = []
+    prev_close = closes[0]
+    for h, l, c in zip(highs[1:], lows[1:], closes[1:]):
+        trs.append(max(h - l, abs(h - prev_close), abs(l - prev_close)))
+        prev_close = c
+    assert true_range_atr(highs, lows, closes) == pytest.approx(sum(trs) / len(trs))
+
+
+def test_true_range_atr_uses_gap_from_previous_close():
+    # gap up: today's range is 1, but the jump from yesterday's close is 5
+    assert true_range_atr([10.0, 15.0], [9.0, 14.0], [10.0, 14.5]) == pytest.approx(5.0)
+
+
+def _daily_bar(sym, day, h, l, c):
+    return SimpleNamespace(S=sym, t=datetime(day.year, day.month, day.day, tzinfo=main.ET).astimezone(timezone.utc), h=h, l=l, c=c)
+
+
+def test_calculate_atrs_ignores_todays_unfinished_bar(monkeypatch):
+    today = date(2024, 3, 6)
+    bars = [
+        _daily_bar("AAA", date(2024, 3, 4), 10.0, 9.0, 10.0),
+        _daily_bar("AAA", date(2024, 3, 5), 11.0, 10.0, 10.5),
+        # opening minute of today: a 20-point gap that must not reach the ATR
+        _daily_bar("AAA", today, 31.0, 30.0, 30.5),
+    ]
+    monkeypatch.setattr(main, "api", SimpleNamespace(get_bars=lambda *a, **kw: bars))
+    monkeypatch.setattr(main, "_atr_cache", {})
+    assert main.calculate_atrs(["AAA"], today) == {"AAA": pytest.approx(1.0)}
+
+
+def test_calculate_atrs_caches_symbols_without_bars(monkeypatch):
+    today = date(2024, 3, 6)
+    calls = []
+
+    def get_bars(symbols, *a, **kw):
+        calls.append(list(symbols))
+        return [_daily_bar("AAA", date(2024, 3, 4), 10.0, 9.0, 10.0),
+                _daily_bar("AAA", date(2024, 3, 5), 11.0, 10.0, 10.5)]
+
+    monkeypatch.setattr(main, "api", SimpleNamespace(get_bars=get_bars))
+    monkeypatch.setattr(main, "_atr_cache", {})
+    assert main.calculate_atrs(["AAA", "NOPE"], today) == {"AAA": pytest.approx(1.0)}
+    assert main.calculate_atrs(["AAA", "NOPE"], today) == {"AAA": pytest.approx(1.0)}
+    assert calls == [["AAA", "NOPE"]]
+
+
+def test_calculate_atrs_retries_after_failed_request(monkeypatch):
+    today = date(2024, 3, 6)
+    monkeypatch.setattr(main, "api", SimpleNamespace(get_bars=lambda *a, **kw: []))
+    monkeypatch.setattr(main, "retry_api_call", lambda *a, **kw: None)
+    monkeypatch.setattr(main, "_atr_cache", {})
+    assert main.calculate_atrs(["AAA"], today) == {}
+    assert "AAA" not in main._atr_cache